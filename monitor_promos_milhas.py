@@ -3,22 +3,51 @@
 Monitor de promoções de transferência de milhas e hotelaria (inclui Accor/ALL).
 - Captura blogs/feeds de viagens e páginas HTML selecionadas.
 - Aceita posts sobre Smiles vindos de blogs, mas EXCLUI links de domínio smiles.com.br.
-Requisitos: feedparser, beautifulsoup4, html5lib, requests, python-dateutil
+Requisitos: feedparser, beautifulsoup4, lxml, requests, python-dateutil (opcionais: fastfeedparser, hyperscan)
 Credenciais: arquivo 'credenciais.txt' com 3 linhas (email, senha_app, destino)
 """
-import csv, os, re, smtplib, sys
+import calendar, csv, hashlib, json, multiprocessing, os, re, smtplib, sys, threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta, timezone
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from urllib.parse import urlparse, urljoin
+from email.utils import parsedate_to_datetime
+from functools import lru_cache, partial
+from itertools import chain
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit
 
-import feedparser, requests
-from bs4 import BeautifulSoup
-from dateutil import parser as dtparser
+import requests
+from lxml import etree, html as lxhtml
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:  # parser de feeds em lxml/Rust; sem ele, cai no feedparser (puro Python)
+    import fastfeedparser
+except ImportError:
+    fastfeedparser = None
+
+try:  # pré-filtro multi-padrão em DFA/SIMD; sem ele, só a regex do re
+    import hyperscan
+except ImportError:
+    hyperscan = None
 
 RECENCIA_DIAS = int(os.getenv("RECENCIA_DIAS", "3"))
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "16"))
+# processos para o parse de feeds/HTML; 1 (padrão) faz o parse na própria thread. O parse já roda
+# em C (lxml/fastfeedparser) e leva milissegundos: cada processo "spawn" reimporta o módulo e custa
+# mais do que economiza com as fontes atuais. Só vale ligar com muitas fontes grandes.
+PARSE_PROCESSOS = int(os.getenv("PARSE_PROCESSOS", "1"))
+# teto de links avaliados por página HTML (páginas com menus gigantes não travam a coleta)
+MAX_ANCORAS_HTML = int(os.getenv("MAX_ANCORAS_HTML", "1000"))
+ARQ_LOG_CSV = "monitor_promos_milhas_log.csv"
+# ETag/Last-Modified + itens já filtrados de cada feed, para GET condicional
+ARQ_CACHE_FEEDS = "monitor_promos_milhas_feeds.json"
+DATA_MINIMA = datetime.min.replace(tzinfo=timezone.utc)  # ordena itens sem data por último
 
 # --- Padrões de filtro ---
+# Escreva os termos em minúsculas: o texto passa por casefold() e a regex não usa IGNORECASE
+# (compilar_filtro recusa termos com maiúsculas).
 POSITIVE_TERMS = [
     # genéricos
     r"\b(bônus|bonus)\b",
@@ -42,10 +71,61 @@ POSITIVE_TERMS = [
 ]
 NEGATIVE_TERMS = []
 
+def _alternancia(termos):
+    return "|".join(f"(?:{p})" for p in termos) if termos else "(?!)"  # lista vazia nunca casa
+
+def _exigir_casefold(termos):
+    # um termo com maiúscula nunca casaria o texto em casefold(): falha na importação, não em silêncio
+    for t in termos:
+        literal = re.sub(r"\\.", "", t)  # ignora escapes como \b, \s, \W
+        if literal != literal.casefold():
+            raise ValueError(f"termo de filtro deve estar em minúsculas (casefold): {t!r}")
+
+def compilar_filtro(positivos, negativos):
+    _exigir_casefold(positivos + negativos)
+    # Uma regex só com grupos nomeados: uma varredura em C por texto decide aceite/rejeição.
+    # Negativos vêm primeiro para vencer quando os dois casam na mesma posição.
+    # Sem IGNORECASE: o texto chega em casefold(), e cada transição vira comparação direta.
+    if not negativos:
+        return re.compile(f"(?P<pos>{_alternancia(positivos)})")
+    # com negativos, o positivo fica num lookahead (largura zero): o finditer não pula o trecho
+    # casado e ainda enxerga um negativo que comece dentro dele ("promo latam pass" com "pass")
+    return re.compile(f"(?P<neg>{_alternancia(negativos)})|(?=(?P<pos>{_alternancia(positivos)}))")
+
+FILTRO_RE = compilar_filtro(POSITIVE_TERMS, NEGATIVE_TERMS)
+TEM_NEGATIVOS = bool(NEGATIVE_TERMS)
+
+def compilar_prefiltro(termos):
+    """Banco Hyperscan com todos os termos, usado só para descartar textos sem nenhum acerto.
+
+    Em modo Unicode (UCP) \\b, \\w e \\s seguem as mesmas classes do re; o modo PREFILTER garante um
+    superconjunto dos acertos da regex, que confirma cada candidato.
+    """
+    if hyperscan is None or not termos:
+        return None
+    try:
+        db = hyperscan.Database()
+        db.compile(expressions=[t.encode() for t in termos],
+                   flags=hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+                   | hyperscan.HS_FLAG_PREFILTER | hyperscan.HS_FLAG_SINGLEMATCH)
+        return db
+    except Exception as ex:
+        print(f"[WARN] Hyperscan indisponível, usando só re: {ex}")
+        return None
+
+PREFILTRO_HS = compilar_prefiltro(NEGATIVE_TERMS + POSITIVE_TERMS)
+_HS_LOCK = threading.Lock()  # o scratch do banco não pode ser usado por duas threads ao mesmo tempo
+
 # Bloqueia o site oficial da Smiles, mas NÃO bloqueia blogs que falem de Smiles
 EXCLUDED_DOMAINS = {
     "smiles.com.br", "blog.smiles.com.br", "loja.smiles.com.br"
 }
+_EXCLUDED = frozenset(EXCLUDED_DOMAINS)
+
+# impressão digital dos filtros: entradas do cache gravadas com outros termos/domínios/janela são
+# descartadas (com janela maior, itens antigos que o cache não guardou voltariam a valer)
+ASSINATURA_FILTRO = hashlib.sha1(json.dumps(
+    [POSITIVE_TERMS, NEGATIVE_TERMS, sorted(EXCLUDED_DOMAINS), RECENCIA_DIAS]).encode()).hexdigest()[:16]
 
 # --- Fontes ---
 # Feeds RSS de blogs / portais. (Adicione/retire livremente).
@@ -74,139 +154,349 @@ HTML_SOURCES = {
     "Accor ALL - Ofertas Brasil": "https://all.accor.com/brasil/promocoes.shtml",
 }
 
+# --- Registros ---
+@dataclass(slots=True)
+class Promo:
+    fonte: str
+    titulo: str
+    link: str
+    publicado_em: datetime | None  # UTC; None para itens de páginas HTML
+    metodo: str  # "RSS" ou "HTML"
+
+# --- HTTP ---
+# Uma sessão para todas as fontes: reaproveita conexões TCP/TLS (keep-alive) e pede corpo comprimido.
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "Mozilla/5.0 PromoBot", "Accept-Encoding": "gzip, deflate"})
+# pool do tamanho do MAX_WORKERS: cada thread de coleta tem sua conexão, sem descartes por pool cheio
+_ADAPTER = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS,
+                       max_retries=Retry(total=2, backoff_factor=0.3))
+SESSION.mount("https://", _ADAPTER)
+SESSION.mount("http://", _ADAPTER)
+
 # --- Utilitários ---
+def texto_do_elemento(el):
+    # equivalente ao get_text(" ", strip=True) do BeautifulSoup
+    return " ".join(t.strip() for t in el.itertext() if t.strip())
+
 def limpar_html(txt):
     if not txt:
         return ""
+    if "<" not in txt and "&" not in txt:
+        return txt.strip()  # texto puro (quase todo título): nada a parsear
+    try:
+        # fragmento direto no libxml2, sem montar a árvore do BeautifulSoup
+        frag = lxhtml.fragment_fromstring(txt, create_parent=True)
+        etree.strip_elements(frag, "script", "style", with_tail=False)
+        return texto_do_elemento(frag)
+    except Exception:
+        pass
     try:
-        return BeautifulSoup(txt, "html5lib").get_text(" ", strip=True)
+        from bs4 import BeautifulSoup  # só no fallback: a importação custa caro a cada execução
+        return BeautifulSoup(txt, "lxml").get_text(" ", strip=True)
     except Exception:
         return re.sub("<[^>]+>", " ", txt)
 
-def dentro_recencia(dt, dias=RECENCIA_DIAS):
+def limite_recencia(dias=RECENCIA_DIAS):
+    return datetime.now(timezone.utc) - timedelta(days=dias)
+
+def dentro_recencia(dt, limite=None):
+    # compara com um corte fixo: uma comparação por entrada, sem subtrair/criar timedelta a cada vez
     if not dt:
         return False
-    return (datetime.now(timezone.utc) - dt) <= timedelta(days=dias)
+    return dt >= (limite or limite_recencia())
+
+@lru_cache(maxsize=4096)
+def _data_de_struct(t):
+    return datetime.fromtimestamp(calendar.timegm(t), tz=timezone.utc)
+
+@lru_cache(maxsize=1)
+def _dtparser():
+    # dateutil importado só quando os parsers da stdlib falham; instância única (parserinfo montado uma vez)
+    from dateutil import parser as dtparser
+    return dtparser.parser()
+
+@lru_cache(maxsize=4096)
+def parse_data_texto(c):
+    # muitas entradas repetem a mesma string de data; o dateutil é caro, então memoiza por valor
+    try:
+        # caminhos rápidos da stdlib (ISO-8601 do fastfeedparser, RFC-822 dos RSS); dateutil só no resto
+        try:
+            d = datetime.fromisoformat(c)
+        except ValueError:
+            try:
+                d = parsedate_to_datetime(c)
+            except (TypeError, ValueError):
+                d = _dtparser().parse(c)
+        if not d.tzinfo:
+            d = d.replace(tzinfo=timezone.utc)
+        return d if d.tzinfo is timezone.utc else d.astimezone(timezone.utc)
+    except Exception:
+        return None
 
 def parse_datetime(entry):
-    for c in [getattr(entry, "published", None), getattr(entry, "updated", None),
-              entry.get("published"), entry.get("updated")]:
+    # o feedparser já normaliza as datas para struct_time em UTC; timegm evita reparsear a string
+    for campo in ("published_parsed", "updated_parsed"):
+        t = entry.get(campo)
+        if t:
+            return _data_de_struct(t)
+    for c in (entry.get("published"), entry.get("updated")):
         if not c:
             continue
-        try:
-            d = dtparser.parse(c)
-            if not d.tzinfo:
-                d = d.replace(tzinfo=timezone.utc)
-            return d.astimezone(timezone.utc)
-        except Exception:
-            pass
+        d = parse_data_texto(c)
+        if d:
+            return d
     return None
 
-def tem_match(padroes, texto):
-    for p in padroes:
-        if re.search(p, texto, flags=re.IGNORECASE):
-            return True
-    return False
+def _prefiltro_casa(texto):
+    casou = []
+    def _ao_casar(*_):
+        casou.append(True)
+        return True  # interrompe a varredura no primeiro termo
+    try:
+        with _HS_LOCK:
+            PREFILTRO_HS.scan(texto.encode(), match_event_handler=_ao_casar)
+    except hyperscan.ScanTerminated:
+        pass
+    return bool(casou)
 
-def dominio_excluido(link):
+def classificar(texto):
+    """Retorna "neg", "pos" ou None. Para no primeiro negativo; sem negativos, no primeiro positivo."""
+    texto = texto.casefold()
+    if PREFILTRO_HS is not None and not _prefiltro_casa(texto):
+        return None
+    achou = None
+    for m in FILTRO_RE.finditer(texto):
+        if m.lastgroup == "neg":
+            return "neg"
+        if not TEM_NEGATIVOS:
+            return "pos"
+        achou = "pos"
+    return achou
+
+def normalizar_link(link):
+    """Chave de deduplicação: ignora esquema, fragmento, barra final e parâmetros de rastreio utm_*."""
     try:
-        host = urlparse(link).netloc.lower()
-        return any(host == d or host.endswith("." + d) for d in EXCLUDED_DOMAINS)
-    except Exception:
-        return False
+        p = urlsplit(link.strip())
+    except ValueError:  # URL malformada: compara como veio
+        return link
+    query = urlencode([(k, v) for k, v in parse_qsl(p.query, keep_blank_values=True)
+                       if not k.lower().startswith("utm_")])
+    return f"{p.netloc.lower()}{p.path.rstrip('/')}?{query}"
 
-# --- Coletas ---
-def coletar_rss():
-    itens = []
-    for nome, url in RSS_SOURCES.items():
-        try:
-            feed = feedparser.parse(url)
-            for e in feed.entries:
-                title = limpar_html(getattr(e, "title", "") or e.get("title", ""))
-                summary = limpar_html(getattr(e, "summary", "") or e.get("summary", ""))
-                link = getattr(e, "link", "") or e.get("link", "")
-                dt_pub = parse_datetime(e)
-                if not title or not link:
-                    continue
-                if dominio_excluido(link):
-                    continue
-                if not dentro_recencia(dt_pub):
-                    continue
-                texto = f"{title} {summary}".lower()
-                if tem_match(NEGATIVE_TERMS, texto):
-                    continue
-                if not tem_match(POSITIVE_TERMS, texto):
-                    continue
-                itens.append({
-                    "fonte": nome,
-                    "titulo": title.strip(),
-                    "resumo": summary.strip(),
-                    "link": link.strip(),
-                    "publicado_em": dt_pub.isoformat() if dt_pub else "",
-                    "metodo": "RSS",
-                })
-        except Exception as ex:
-            print(f"[WARN] RSS falhou {nome}: {ex}")
-    return itens
+def deduplicar(itens):
+    # o mesmo post replicado em vários blogs/fontes sai uma vez só (vale a primeira fonte)
+    vistos, unicos = set(), []
+    for it in itens:
+        chave = normalizar_link(it.link)
+        if chave in vistos:
+            continue
+        vistos.add(chave)
+        unicos.append(it)
+    return unicos
+
+def netloc_de(link):
+    try:
+        return urlsplit(link).netloc
+    except ValueError:  # ex.: IPv6 malformado
+        return ""
 
-def http_get(url, timeout=20):
+def host_excluido(netloc):
+    """Recebe o netloc já extraído, para a URL ser parseada uma vez só por link."""
+    host = netloc.lower().partition(":")[0]
+    # testa o host e cada sufixo de domínio (a.b.c -> b.c -> c): poucas consultas ao set,
+    # independente do tamanho de EXCLUDED_DOMAINS, sem montar listas nem juntar strings
+    while host:
+        if host in _EXCLUDED:
+            return True
+        host = host.partition(".")[2]
+    return False
+
+# --- Coletas ---
+def http_get(url, timeout=20, headers=None):
     try:
-        r = requests.get(url, headers={"User-Agent": "Mozilla/5.0 PromoBot"}, timeout=timeout)
-        if r.status_code == 200 and r.text:
+        r = SESSION.get(url, headers=headers, timeout=timeout)
+        # r.content e não r.text: os parsers leem bytes, e .text decodificaria (e adivinharia o charset) à toa
+        if r.status_code == 304 or (r.status_code == 200 and r.content):
             return r
     except Exception as ex:
         print(f"[WARN] GET falhou {url}: {ex}")
     return None
 
-def coletar_html():
+_PARSE_POOL = None
+
+def parse_em_processo(func, *args):
+    """Roda o parse (CPU) no pool de processos, se houver; as threads ficam só com a rede."""
+    if _PARSE_POOL is None:
+        return func(*args)
+    return _PARSE_POOL.submit(func, *args).result()
+
+def parse_feed(conteudo, headers=None):
+    if fastfeedparser is not None:
+        try:
+            return fastfeedparser.parse(conteudo)
+        except Exception:
+            pass  # feed fora do padrão: o feedparser é mais tolerante
+    import feedparser  # só no fallback: evita o custo de importação quando o fastfeedparser resolve
+    # com os cabeçalhos da resposta, o feedparser usa o charset do Content-Type como faria no próprio fetch
+    return feedparser.parse(conteudo, response_headers=headers)
+
+def filtrar_feed(nome, conteudo, headers=None):
     itens = []
-    for nome, url in HTML_SOURCES.items():
-        resp = http_get(url)
-        if not resp:
+    feed = parse_feed(conteudo, headers)
+    limite = limite_recencia()
+    for e in feed.entries:
+        # filtros baratos primeiro: a maioria das entradas de um feed já está fora da janela
+        dt_pub = parse_datetime(e)
+        if not dentro_recencia(dt_pub, limite):
+            continue
+        link = e.get("link") or ""
+        if not link or host_excluido(netloc_de(link)):
+            continue
+        title = limpar_html(e.get("title") or "")
+        if not title:
             continue
+        veredito = classificar(title)
+        if veredito == "neg":
+            continue
+        if veredito is None or TEM_NEGATIVOS:
+            # o título não decide sozinho: só aqui vale limpar o HTML do resumo
+            summary = limpar_html(e.get("summary") or e.get("description") or "")
+            if classificar(f"{title} {summary}") != "pos":
+                continue
+        itens.append(Promo(nome, title.strip(), link.strip(), dt_pub, "RSS"))
+    return itens
+
+# compilada uma vez; o teto de links é aplicado dentro da própria consulta (em C)
+_XPATH_LINKS = etree.XPath("(//a[@href])[position() <= $teto]")
+
+_CHARSET_RE = re.compile(r"charset=[\"']?([\w.:-]+)", re.I)
+
+def charset_declarado(resp):
+    # só o charset explícito do Content-Type; o resp.encoding do requests assume ISO-8859-1 para text/*
+    m = _CHARSET_RE.search(resp.headers.get("Content-Type") or "")
+    return m.group(1) if m else None
+
+def parser_html(conteudo, charset=None):
+    """Parser do lxml com a codificação certa: charset do HTTP, senão UTF-8 se os bytes forem UTF-8 válido.
+
+    Sem nenhum dos dois, o libxml2 usa o <meta charset> da página (ou Latin-1, se não houver).
+    """
+    if charset:
         try:
-            soup = BeautifulSoup(resp.text, "html5lib")
-            for a in soup.select("a[href]"):
-                href = a.get("href") or ""
-                texto = a.get_text(" ", strip=True) or ""
-                if not href or href.startswith("#"):
-                    continue
-                if href.startswith("/"):
-                    href = urljoin(url, href)
-                if dominio_excluido(href):
-                    continue
-                alvo = f"{texto} {href}".lower()
-                if tem_match(NEGATIVE_TERMS, alvo):
-                    continue
-                if not tem_match(POSITIVE_TERMS, alvo):
-                    continue
-                itens.append({
-                    "fonte": nome,
-                    "titulo": texto[:160] or "(sem título)",
-                    "resumo": "",
-                    "link": href,
-                    "publicado_em": "",
-                    "metodo": "HTML",
-                })
-        except Exception as ex:
-            print(f"[WARN] HTML falhou {nome}: {ex}")
+            return lxhtml.HTMLParser(encoding=charset)
+        except LookupError:  # charset desconhecido: segue como se não houvesse
+            pass
+    try:
+        conteudo.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    return lxhtml.HTMLParser(encoding="utf-8")
+
+def filtrar_html(nome, url, conteudo, charset=None):
+    itens = []
+    tree = lxhtml.fromstring(conteudo, parser=parser_html(conteudo, charset))
+    netloc_pagina = netloc_de(url)
+    for a in _XPATH_LINKS(tree, teto=MAX_ANCORAS_HTML):
+        href = a.get("href") or ""
+        if not href or href.startswith("#"):
+            continue
+        relativo = href.startswith("/") and not href.startswith("//")
+        if href.startswith("/"):
+            href = urljoin(url, href)
+        # link relativo à raiz fica no host da página: nada a parsear
+        netloc = netloc_pagina if relativo else netloc_de(href)
+        if host_excluido(netloc):
+            continue
+        texto = texto_do_elemento(a)
+        if classificar(f"{texto} {href}") != "pos":
+            continue
+        itens.append(Promo(nome, texto[:160] or "(sem título)", href, None, "HTML"))
+    return itens
+
+def coletar_rss_fonte(nome, url, cache=None):
+    cache = {} if cache is None else cache
+    anterior = cache.get(url) or {}
+    if anterior.get("filtro") != ASSINATURA_FILTRO:
+        anterior = {}  # filtrado com outra configuração: sem GET condicional, refaz do zero
+    condicional = {}
+    if anterior.get("etag"):
+        condicional["If-None-Match"] = anterior["etag"]
+    if anterior.get("modified"):
+        condicional["If-Modified-Since"] = anterior["modified"]
+    itens = []
+    try:
+        resp = http_get(url, headers=condicional)
+        if not resp:
+            return itens
+        if resp.status_code == 304:
+            # feed inalterado: reaproveita o que já passou nos filtros, revalidando a janela
+            limite = limite_recencia()
+            return [it for it in anterior.get("itens", []) if dentro_recencia(it.publicado_em, limite)]
+        # chaves em minúsculas: o feedparser procura 'content-type', e o requests mantém a grafia do servidor
+        cabecalhos = {k.lower(): v for k, v in resp.headers.items()}
+        itens = parse_em_processo(filtrar_feed, nome, resp.content, cabecalhos)
+        etag, modified = resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+        if etag or modified:
+            cache[url] = {"etag": etag, "modified": modified, "filtro": ASSINATURA_FILTRO, "itens": itens}
+        else:
+            cache.pop(url, None)
+    except Exception as ex:
+        print(f"[WARN] RSS falhou {nome}: {ex}")
     return itens
 
+def coletar_html_fonte(nome, url):
+    resp = http_get(url)
+    if not resp:
+        return []
+    try:
+        return parse_em_processo(filtrar_html, nome, url, resp.content, charset_declarado(resp))
+    except Exception as ex:
+        print(f"[WARN] HTML falhou {nome}: {ex}")
+    return []
+
+def coletar_em_paralelo(tarefas):
+    """Executa (coletor, nome, url) em threads; a coleta é dominada por espera de rede."""
+    global _PARSE_POOL
+    if not tarefas:
+        return []
+    n_proc = min(PARSE_PROCESSOS, len(tarefas))
+    # "spawn": o pool recebe tarefas a partir das threads, e fork com threads ativas não é seguro
+    if n_proc > 1:
+        _PARSE_POOL = ProcessPoolExecutor(max_workers=n_proc, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(tarefas))) as ex:
+            lotes = list(ex.map(lambda t: t[0](t[1], t[2]), tarefas))
+    finally:
+        if _PARSE_POOL is not None:
+            _PARSE_POOL.shutdown()
+            _PARSE_POOL = None
+    return deduplicar(chain.from_iterable(lotes))
+
+def coletar_tudo(cache=None):
+    # RSS e HTML na mesma fila: as páginas HTML não esperam o último feed terminar
+    rss = partial(coletar_rss_fonte, cache=cache)
+    tarefas = [(rss, n, u) for n, u in RSS_SOURCES.items()]
+    tarefas += [(coletar_html_fonte, n, u) for n, u in HTML_SOURCES.items()]
+    return coletar_em_paralelo(tarefas)
+
 # --- Saídas ---
+def chave_ordem(it):
+    return (it.publicado_em or DATA_MINIMA, it.fonte, it.titulo)
+
+def ordenar(itens):
+    """Mais recentes primeiro, no próprio list (sem cópia); e-mail e CSV saem na mesma ordem."""
+    itens.sort(key=chave_ordem, reverse=True)
+
+def _linha_email(i, it):
+    dt_fmt = it.publicado_em.strftime("%Y-%m-%d %H:%M UTC") if it.publicado_em else ""
+    return f"{i}. [{it.fonte}] {it.titulo}\n   Data: {dt_fmt}\n   Link: {it.link}\n"
+
 def formatar_email(itens):
+    """Espera os itens já ordenados (ver ordenar)."""
     if not itens:
         return f"Nenhuma promoção relevante encontrada nos últimos {RECENCIA_DIAS} dias."
-    def key_sort(x): return (x["publicado_em"] or "", x["fonte"], x["titulo"])
-    linhas = [f"✈️ Promoções (milhas + Accor/ALL) – últimos {RECENCIA_DIAS} dias\n"]
-    for i, it in enumerate(sorted(itens, key=key_sort, reverse=True), 1):
-        dt_fmt = ""
-        if it["publicado_em"]:
-            try:
-                dt_fmt = dtparser.parse(it["publicado_em"]).astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
-            except Exception:
-                dt_fmt = it["publicado_em"]
-        linhas.append(f"{i}. [{it['fonte']}] {it['titulo']}\n   Data: {dt_fmt}\n   Link: {it['link']}\n")
-    return "\n".join(linhas)
+    cabecalho = f"✈️ Promoções (milhas + Accor/ALL) – últimos {RECENCIA_DIAS} dias\n"
+    return "\n".join(chain((cabecalho,), (_linha_email(i, it) for i, it in enumerate(itens, 1))))
 
 def enviar_email(corpo, assunto=None):
     caminho = "credenciais.txt"
@@ -217,38 +507,71 @@ def enviar_email(corpo, assunto=None):
         assunto = f"✈️ Promoções (Milhas + Accor/ALL) – últimos {RECENCIA_DIAS} dias"
     msg = MIMEMultipart(); msg["From"]=email_user; msg["To"]=email_to; msg["Subject"]=assunto
     msg.attach(MIMEText(corpo, "plain", "utf-8"))
-    s = smtplib.SMTP("smtp.gmail.com", 587); s.starttls(); s.login(email_user, email_pass); s.send_message(msg); s.quit()
+    # TLS implícito (465): um handshake a menos que SMTP + STARTTLS na 587
+    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as s:
+        s.login(email_user, email_pass); s.send_message(msg)
+
+def enviar_email_em_segundo_plano(corpo):
+    """Dispara o envio numa thread; quem chama faz join() no fim para não sair antes do SMTP."""
+    def _enviar():
+        try:
+            enviar_email(corpo); print("✅ Email enviado com sucesso!")
+        except Exception as ex:
+            print("❌ Erro ao enviar e-mail:", ex, file=sys.stderr)
+    t = threading.Thread(target=_enviar, name="envio-email")
+    t.start()
+    return t
+
+def _json_default(obj):
+    # asdict() só na escrita; o datetime interno volta aqui e vira string ISO
+    if isinstance(obj, Promo):
+        return asdict(obj)
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"não serializável: {type(obj).__name__}")
+
+def carregar_cache_feeds(caminho=ARQ_CACHE_FEEDS):
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        for entrada in cache.values():
+            entrada["itens"] = [Promo(**dict(it, publicado_em=datetime.fromisoformat(it["publicado_em"])))
+                                for it in entrada.get("itens", [])]
+        return cache
+    except (OSError, ValueError, KeyError, AttributeError, TypeError):
+        return {}
+
+def salvar_cache_feeds(cache, caminho=ARQ_CACHE_FEEDS):
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, default=_json_default)
 
-def salvar_csv(itens, caminho="monitor_promos_milhas_log.csv"):
+def salvar_csv(itens, caminho=ARQ_LOG_CSV):
     campos = ["timestamp_execucao_utc", "fonte", "titulo", "link", "publicado_em", "metodo"]
     ts = datetime.now(timezone.utc).isoformat()
     novo = not os.path.exists(caminho)
-    with open(caminho, "a", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=campos)
-        if novo: w.writeheader()
-        for it in itens:
-            w.writerow({
-                "timestamp_execucao_utc": ts,
-                "fonte": it["fonte"],
-                "titulo": it["titulo"],
-                "link": it["link"],
-                "publicado_em": it["publicado_em"],
-                "metodo": it["metodo"],
-            })
+    with open(caminho, "a", encoding="utf-8", newline="", buffering=1 << 16) as f:
+        w = csv.writer(f)
+        if novo: w.writerow(campos)
+        w.writerows((ts, it.fonte, it.titulo, it.link,
+                     it.publicado_em.isoformat() if it.publicado_em else "", it.metodo) for it in itens)
 
 def main():
     print(f"🔍 Buscando promoções (milhas + Accor/ALL), últimos {RECENCIA_DIAS} dias…")
-    itens = coletar_rss() + coletar_html()
+    cache = carregar_cache_feeds()
+    itens = coletar_tudo(cache)
+    ordenar(itens)
     corpo = formatar_email(itens)
     print("\n===== PRÉVIA DO EMAIL =====\n"); print(corpo); print("\n===========================\n")
-    try:
-        enviar_email(corpo); print("✅ Email enviado com sucesso!")
-    except Exception as ex:
-        print("❌ Erro ao enviar e-mail:", ex, file=sys.stderr)
+    envio = enviar_email_em_segundo_plano(corpo)
     try:
         salvar_csv(itens)
     except Exception as ex:
         print("[WARN] Falha ao salvar CSV:", ex, file=sys.stderr)
+    try:
+        salvar_cache_feeds(cache)
+    except Exception as ex:
+        print("[WARN] Falha ao salvar cache dos feeds:", ex, file=sys.stderr)
+    envio.join()
 
 if __name__ == "__main__":
     main()